@@ -1,36 +1,146 @@
+import os
+import re
+import sys
+import warnings
+
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib import font_manager
+from matplotlib.offsetbox import AnchoredText
 from matplotlib.widgets import Slider
 import numpy as np
 
-# --- Helper Functions (无需改动) ---
+try:
+    from numba import vectorize as _numba_vectorize
+except ImportError:
+    _numba_vectorize = None
+
+try:
+    import numexpr as _numexpr
+except ImportError:
+    _numexpr = None
+
+# --- 中文字体：每个进程只配置一次，并预先解析 SimHei，避免首次绘制时才查找字体 ---
+try:
+    font_manager.findfont(font_manager.FontProperties(family='SimHei'), fallback_to_default=False)
+    plt.rcParams['font.sans-serif'] = ['SimHei']
+    plt.rcParams['axes.unicode_minus'] = False
+except ValueError:
+    warnings.warn("未找到中文字体'SimHei'，图表中的中文可能无法显示。")
+
+# --- Helper Functions ---
+# 预编译的输入格式校验，无效输入直接被拒绝，不必走 float()/int() 的异常路径
+_FLOAT_RE = re.compile(r'^[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?$')
+_INT_RE = re.compile(r'^[+-]?\d+$')
+
 def get_float_input(prompt):
     while True:
-        try: return float(input(prompt))
-        except ValueError: print("输入无效，请输入一个有效的数字。")
+        s = input(prompt).strip()
+        if _FLOAT_RE.match(s): return float(s)
+        print("输入无效，请输入一个有效的数字。")
 
 def get_int_input(prompt):
     while True:
-        try:
-            value = int(input(prompt))
-            if value > 0: return value
-            else: print("请输入一个正整数。")
-        except ValueError: print("输入无效，请输入一个有效的整数。")
+        s = input(prompt).strip()
+        if not _INT_RE.match(s):
+            print("输入无效，请输入一个有效的整数。")
+            continue
+        value = int(s)
+        if value > 0: return value
+        else: print("请输入一个正整数。")
+
+# --- Calculation Functions ---
+def _covered_call_profit_kernel(expiration_price, purchase_price, strike_price, premium_per_share, num_shares):
+    exit_price = min(expiration_price, strike_price)
+    return (exit_price - purchase_price) * num_shares + premium_per_share * num_shares
+
+# numba 并行 ufunc 和 numexpr 融合内核都有固定的启动开销，只在大网格 (如蒙特卡洛路径) 上才划算；
+# 脚本自身的 3 点曲线和 400 点滑块网格用普通 NumPy 表达式更快
+_BATCH_KERNEL_MIN_SIZE = 100_000
+_parallel_ufunc = None
+
+def _get_parallel_ufunc():
+    # 首次在大网格上使用时才 JIT 编译，导入模块和交互式使用都不承担编译开销
+    global _parallel_ufunc
+    if _parallel_ufunc is None:
+        _parallel_ufunc = _numba_vectorize(
+            ['float64(float64, float64, float64, float64, float64)'],
+            nopython=True, fastmath=True, target='parallel',
+        )(_covered_call_profit_kernel)
+    return _parallel_ufunc
+
+# 数组批量计算：大网格优先用 numba 并行 ufunc，其次 numexpr，否则用等价的 NumPy 数组表达式。
+# 调用方需先把参数转换为浮点数组
+def _covered_call_profit_batch(expiration_price, purchase_price, strike_price, premium_per_share, num_shares, out=None):
+    # 按广播后的元素个数判断，价格[:, None] × 行权价[None, :] 这类网格也能走快速路径
+    size = np.broadcast(expiration_price, purchase_price, strike_price, premium_per_share, num_shares).size
+    if size >= _BATCH_KERNEL_MIN_SIZE:
+        if _numba_vectorize is not None:
+            return _get_parallel_ufunc()(expiration_price, purchase_price, strike_price, premium_per_share, num_shares, out=out)
+        if _numexpr is not None:
+            # 单个融合内核，多线程分块计算，直接写入 out，不产生中间临时数组
+            return _numexpr.evaluate(
+                "(where(p <= k, p, k) - buy) * n + prem * n",
+                local_dict={'p': expiration_price, 'k': strike_price, 'buy': purchase_price,
+                            'n': num_shares, 'prem': premium_per_share},
+                out=out,
+            )
+    out = np.minimum(expiration_price, strike_price, out=out)
+    out -= purchase_price
+    out *= num_shares
+    out += premium_per_share * num_shares
+    return out
 
-# --- Calculation Functions (无需改动) ---
 def calculate_covered_call_profit(expiration_price, purchase_price, strike_price, premium_per_share, num_shares):
-    total_premium = premium_per_share * num_shares
-    if expiration_price <= strike_price:
-        stock_profit = (expiration_price - purchase_price) * num_shares
-    else:
-        stock_profit = (strike_price - purchase_price) * num_shares
-    return stock_profit + total_premium
+    # 单个价格直接走纯 Python 内核；并行 ufunc 的线程调度开销只在大批量数组上才值得
+    return _covered_call_profit_kernel(expiration_price, purchase_price, strike_price, premium_per_share, num_shares)
 
 def calculate_buy_and_hold_profit(expiration_price, purchase_price, num_shares):
     return (expiration_price - purchase_price) * num_shares
 
+def calculate_payoffs_vectorized(expiration_prices, purchase_price, strike_price, premium_per_share, num_shares, out=None):
+    # 批量接口：所有参数都可以是标量、列表或数组，按 NumPy 广播规则组合
+    # (例如 价格[:, None] 与 行权价[None, :] 组成网格)，返回 (Covered Call 收益, 持股收益)。
+    # 传入形状为 (*广播形状, 2) 的 out 时，两列收益直接原地写入 out，不产生临时数组
+    prices, purchase, strikes, premiums, shares = (
+        np.asarray(arg, dtype=float)
+        for arg in (expiration_prices, purchase_price, strike_price, premium_per_share, num_shares)
+    )
+    # 参数形状无法广播时在这里直接抛出 ValueError
+    shape = np.broadcast_shapes(prices.shape, purchase.shape, strikes.shape, premiums.shape, shares.shape)
+    if out is None:
+        out = np.empty(shape + (2,))
+    elif out.shape != shape + (2,):
+        raise ValueError(f"out 的形状应为 {shape + (2,)}，实际为 {out.shape}")
+    cc_profits, bh_profits = out[..., 0], out[..., 1]
+    _covered_call_profit_batch(prices, purchase, strikes, premiums, shares, out=cc_profits)
+    np.subtract(prices, purchase, out=bh_profits)
+    bh_profits *= shares
+    return cc_profits, bh_profits
+
+# --- 收益摘要文本模板 (按收益差的符号预先拼好，更新时只需一次 format) ---
+_SUMMARY_HEAD = (
+    "--- 在到期日股价为 ${0:.2f} 时的收益分析 ---\n\n"
+    "策略一 (Covered Call) 总收益: ${1:,.2f}\n"
+    "策略二 (仅持有正股) 总收益: ${2:,.2f}\n\n"
+)
+SUMMARY_TEMPLATES = {
+    1: _SUMMARY_HEAD + "结论：Covered Call 策略比仅持股多赚了 ${3:,.2f}",
+    -1: _SUMMARY_HEAD + "结论：Covered Call 策略比仅持股少赚了 ${3:,.2f}",
+    0: _SUMMARY_HEAD + "结论：两种策略收益几乎相等。",
+}
+
+# 无界面模式下图表保存的位置
+HEADLESS_OUTPUT = 'covered_call_profit.png'
+
+
+# 重绘由 main() 中的 blit 负责，滑块自身 (包括构造时的 set_val(valinit)) 不触发整图重绘
+class _BlitSlider(Slider):
+    drawon = False
+
 
 # --- 主程序 ---
-def main():
+def main(headless=False):
     print("--- 备兑看涨期权 (Covered Call) 动态收益分析工具 ---")
     
     # 1. 获取基本参数
@@ -43,11 +153,15 @@ def main():
     print("-" * 30)
     print("正在生成交互式图表...")
 
-    try:
-        plt.rcParams['font.sans-serif'] = ['SimHei']
-        plt.rcParams['axes.unicode_minus'] = False
-    except:
-        print("\n注意：未找到中文字体'SimHei'，图表中的中文可能无法显示。")
+    # 不在滑块网格上的价格 (如用户输入的初始价格) 用这两个闭包精确计算；
+    # 权利金总额在整个分析过程中不变，只算一次
+    total_premium = premium_per_share * num_shares
+
+    def cc_profit_at(price):
+        return (min(price, strike_price) - purchase_price) * num_shares + total_premium
+
+    def bh_profit_at(price):
+        return (price - purchase_price) * num_shares
 
     # 2. 创建图表和坐标轴
     fig, ax = plt.subplots(figsize=(14, 8))
@@ -56,20 +170,28 @@ def main():
     # 3. 绘制静态背景曲线
     plot_min_price = min(purchase_price, strike_price) * 0.8
     plot_max_price = (strike_price + premium_per_share) * 1.2 # 确保交叉点在视图内
-    expiration_prices = np.linspace(plot_min_price, plot_max_price, 400)
+    # 两条收益曲线都是折线：Covered Call 只在行权价处有一个拐点，持股收益是一条直线，
+    # 因此只需在端点和行权价处取值，无需密集采样
+    vertices = np.array([plot_min_price, strike_price, plot_max_price])
+    cc_vertex_profits, bh_vertex_profits = calculate_payoffs_vectorized(vertices, purchase_price, strike_price, premium_per_share, num_shares)
+    ax.plot(vertices, cc_vertex_profits,
+            label='备兑看涨期权 (Covered Call)', color='blue', linewidth=2, zorder=2)
+    ax.plot(vertices, bh_vertex_profits,
+            label='仅持有正股 (Buy & Hold)', color='orange', linestyle='--', linewidth=2, zorder=2)
 
-    cc_profits = [calculate_covered_call_profit(p, purchase_price, strike_price, premium_per_share, num_shares) for p in expiration_prices]
-    bh_profits = [calculate_buy_and_hold_profit(p, purchase_price, num_shares) for p in expiration_prices]
-
-    ax.plot(expiration_prices, cc_profits, label='备兑看涨期权 (Covered Call)', color='blue', linewidth=2, zorder=2)
-    ax.plot(expiration_prices, bh_profits, label='仅持有正股 (Buy & Hold)', color='orange', linestyle='--', linewidth=2, zorder=2)
+    # 滑块价格网格：直接把网格作为滑块的 valstep，滑块值总是某个网格点本身，更新时直接查表
+    expiration_prices = np.linspace(plot_min_price, plot_max_price, 400)
+    price_step = expiration_prices[1] - expiration_prices[0]
+    # 两种策略的收益存放在同一个 (N, 2) 数组中，查表时一行即可取出两个值
+    grid_profits = np.empty((expiration_prices.size, 2))
+    calculate_payoffs_vectorized(expiration_prices, purchase_price, strike_price, premium_per_share, num_shares, out=grid_profits)
     
     ax.axhline(0, color='black', linestyle='-', linewidth=0.7)
     ax.axvline(purchase_price, color='red', linestyle=':', label=f'买入价: ${purchase_price:.2f}')
     
     # --- 新增功能 1：计算并标记关键点 ---
     # 最大收益点 (发生在行权价)
-    max_profit = calculate_covered_call_profit(strike_price, purchase_price, strike_price, premium_per_share, num_shares)
+    max_profit = (strike_price - purchase_price + premium_per_share) * num_shares
     ax.plot(strike_price, max_profit, 'go', markersize=10, zorder=4, label=f'最大收益点 (at Strike)')
     ax.annotate(f'最大收益: ${max_profit:,.2f}',
                 xy=(strike_price, max_profit),
@@ -79,7 +201,7 @@ def main():
 
     # 策略交叉点
     crossover_price = strike_price + premium_per_share
-    crossover_profit = calculate_buy_and_hold_profit(crossover_price, purchase_price, num_shares)
+    crossover_profit = max_profit  # 交叉点处持股收益恰好等于 Covered Call 的封顶收益
     ax.plot(crossover_price, crossover_profit, 'mo', markersize=10, zorder=4, label='策略交叉点')
     ax.axvline(crossover_price, color='magenta', linestyle=':', label=f'交叉价格: ${crossover_price:.2f}')
     ax.annotate(f'股价 > ${crossover_price:.2f}\n持股收益更高',
@@ -90,48 +212,133 @@ def main():
 
 
     # 4. 绘制初始动态元素
-    cc_marker, = ax.plot([], [], 'b*', markersize=15, zorder=5)
-    bh_marker, = ax.plot([], [], 'o', color='orange', markersize=10, zorder=5)
-    summary_text_obj = fig.text(0.02, 0.98, "", ha="left", va="top", fontsize=10, bbox=dict(boxstyle='round,pad=0.5', fc='aliceblue', alpha=0.8))
+    # 动态元素设为 animated，由 blit 单独绘制，避免每次拖动都重绘整张图
+    cc_marker, = ax.plot([], [], 'b*', markersize=15, zorder=5, animated=True)
+    bh_marker, = ax.plot([], [], 'o', color='orange', markersize=10, zorder=5, animated=True)
+    # 摘要框锚定在坐标轴内，作为 animated 元素随 blit 一起重绘
+    summary_box = AnchoredText("", loc='upper left', prop=dict(size=10), frameon=True)
+    summary_box.patch.set(boxstyle='round,pad=0.5', fc='aliceblue', alpha=0.8)
+    summary_box.set_animated(True)
+    summary_box.set_in_layout(False)
+    ax.add_artist(summary_box)
+
+    # 标记点坐标复用长度为 1 的数组，避免每次更新都新建列表
+    marker_x = np.empty(1)
+    marker_cc_y = np.empty(1)
+    marker_bh_y = np.empty(1)
+
+    # 缓存静态背景；每次完整重绘 (包括窗口缩放) 后刷新。
+    # 背景覆盖整张图，以便滑块手柄和数值文本也能与标记点一起 blit
+    background = {'image': None}
+    animated_artists = [cc_marker, bh_marker, summary_box]
+
+    def draw_animated():
+        for artist in animated_artists:
+            fig.draw_artist(artist)
+
+    def on_draw(event):
+        if fig.canvas.is_saving():
+            # 保存图片时动态元素已随整图一起绘制
+            return
+        background['image'] = fig.canvas.copy_from_bbox(fig.bbox)
+        # 整图重绘 (如窗口缩放) 时滑块已处在最新位置，先补上被节流跳过的值，避免标记点落后于滑块
+        if throttle['pending'] is not None:
+            val, throttle['pending'] = throttle['pending'], None
+            set_price(val)
+        draw_animated()
+
+    if not headless:
+        fig.canvas.mpl_connect('draw_event', on_draw)
 
     # 5. 定义更新函数
-    def update(val):
+    throttle = {'n': 0, 'pending': None}
+    update_state = {'last_val': None}
+
+    def set_price(val):
+        # 只更新标记点和摘要框的状态，不绘制。滑块吸附到网格后，拖动时常会重复触发
+        # 同一个值，此时返回 False，调用方无需重绘
+        if val == update_state['last_val']:
+            return False
+        update_state['last_val'] = val
+
         current_price = val
-        cc_profit = calculate_covered_call_profit(current_price, purchase_price, strike_price, premium_per_share, num_shares)
-        bh_profit = calculate_buy_and_hold_profit(current_price, purchase_price, num_shares)
+        # 恰好落在网格点上时直接查表；其他价格 (如用户输入的初始价格) 精确计算
+        i = int(round((current_price - expiration_prices[0]) / price_step))
+        if 0 <= i < len(expiration_prices) and expiration_prices[i] == current_price:
+            cc_profit, bh_profit = grid_profits[i]
+        else:
+            cc_profit = cc_profit_at(current_price)
+            bh_profit = bh_profit_at(current_price)
 
-        cc_marker.set_data([current_price], [cc_profit])
-        bh_marker.set_data([current_price], [bh_profit])
+        marker_x[0] = current_price
+        marker_cc_y[0] = cc_profit
+        marker_bh_y[0] = bh_profit
+        cc_marker.set_data(marker_x, marker_cc_y)
+        bh_marker.set_data(marker_x, marker_bh_y)
 
         difference = cc_profit - bh_profit
         if abs(difference) < 0.01:
-             conclusion_str = "结论：两种策略收益几乎相等。"
+            template = SUMMARY_TEMPLATES[0]
         elif difference > 0:
-            conclusion_str = f"结论：Covered Call 策略比仅持股多赚了 ${difference:,.2f}"
+            template = SUMMARY_TEMPLATES[1]
         else:
-            conclusion_str = f"结论：Covered Call 策略比仅持股少赚了 ${abs(difference):,.2f}"
-        
-        new_summary_text = (
-            f"--- 在到期日股价为 ${current_price:.2f} 时的收益分析 ---\n\n"
-            f"策略一 (Covered Call) 总收益: ${cc_profit:,.2f}\n"
-            f"策略二 (仅持有正股) 总收益: ${bh_profit:,.2f}\n\n"
-            f"{conclusion_str}"
-        )
-        summary_text_obj.set_text(new_summary_text)
-        fig.canvas.draw_idle()
+            template = SUMMARY_TEMPLATES[-1]
+        summary_box.txt.set_text(template.format(current_price, cc_profit, bh_profit, abs(difference)))
+        return True
+
+    def update(val):
+        if not set_price(val):
+            return
+        if background['image'] is None:
+            # 首次完整绘制之前还没有背景可用；那次绘制 (或无界面模式下的 savefig) 会画出动态元素
+            return
+        fig.canvas.restore_region(background['image'])
+        draw_animated()
+        fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
 
     # 6. 创建滑块
     ax_slider = fig.add_axes([0.2, 0.05, 0.65, 0.03])
-    price_slider = Slider(
+    price_slider = _BlitSlider(
         ax=ax_slider,
         label='拖动我!\n到期日股价',
         valmin=plot_min_price,
         valmax=plot_max_price,
         valinit=initial_expiration_price,
-        valstep=(plot_max_price - plot_min_price) / 400
+        valstep=expiration_prices
     )
+    # 滑块随值变化的部分改为 animated，由 update() 与标记点一并 blit
+    for artist in (price_slider.poly, getattr(price_slider, '_handle', None), price_slider.valtext):
+        if artist is not None:
+            artist.set_animated(True)
+            animated_artists.append(artist)
     
-    price_slider.on_changed(update)
+    # 无界面模式只输出一张静态 PNG，不需要滑块交互
+    if not headless:
+        # 拖动时每 disp_skip 个事件才重绘一次；停止拖动 50ms 后补画最终位置
+        disp_skip = 3
+        final_timer = fig.canvas.new_timer(interval=50)
+        final_timer.single_shot = True
+
+        def flush_pending():
+            if throttle['pending'] is not None:
+                val, throttle['pending'] = throttle['pending'], None
+                update(val)
+
+        final_timer.add_callback(flush_pending)
+
+        def on_slider_changed(val):
+            throttle['n'] += 1
+            throttle['pending'] = val
+            final_timer.stop()
+            final_timer.start()
+            if throttle['n'] % disp_skip != 0:
+                return
+            throttle['pending'] = None
+            update(val)
+
+        price_slider.on_changed(on_slider_changed)
+
     update(initial_expiration_price)
     
     # 7. 设置最终图表样式
@@ -140,8 +347,17 @@ def main():
     ax.set_ylabel(f'基于 {num_shares} 股的总收益/亏损 ($)', fontsize=12)
     ax.legend(loc='lower right')
     ax.grid(True)
-    
-    plt.show()
+
+    if headless:
+        fig.savefig(HEADLESS_OUTPUT)
+        print(f"图表已保存至 {HEADLESS_OUTPUT}")
+    else:
+        plt.show()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 无界面模式 (--headless 或环境变量 CC_HEADLESS)：直接用 Agg 渲染 PNG，不加载 Tk/Qt 等 GUI 后端。
+    # 只在作为脚本运行时解析，导入本模块的程序不受影响；此时尚未创建图表，切换后端仍然有效
+    headless = '--headless' in sys.argv[1:] or bool(os.environ.get('CC_HEADLESS'))
+    if headless:
+        matplotlib.use('Agg')
+    main(headless)
\ No newline at end of file